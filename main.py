@@ -7,10 +7,13 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
-import json
+import orjson
 import os
 from datetime import datetime
 
+# Indented output like the previous json.dump(indent=2), with NumPy scalars/arrays supported
+JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+
 def create_and_analyze_network(network_nodes, mobility_data, output_dir):
     """Helper function to create and analyze network"""
     G = create_vaccine_distribution_network(network_nodes, mobility_data)
@@ -67,15 +70,15 @@ def main():
             G, analysis_results = create_and_analyze_network(network_nodes, covid_data['mobility'], args.output_dir)
             
             # Save network analysis results
-            with open(f"{args.output_dir}/network_analysis_results.json", 'w') as f:
-                # Convert to serializable format
+            with open(f"{args.output_dir}/network_analysis_results.json", 'wb') as f:
+                # Everything except the graph itself is serializable as-is
                 serializable_results = {
-                    'degree_centrality': {k: float(v) for k, v in analysis_results['degree_centrality'].items()},
-                    'betweenness_centrality': {k: float(v) for k, v in analysis_results['betweenness_centrality'].items()},
-                    'bottlenecks': [[b[0], float(b[1]), float(b[2])] for b in analysis_results['bottlenecks']],
+                    'degree_centrality': analysis_results['degree_centrality'],
+                    'betweenness_centrality': analysis_results['betweenness_centrality'],
+                    'bottlenecks': analysis_results['bottlenecks'],
                     'manufacturers': analysis_results['manufacturers']
                 }
-                json.dump(serializable_results, f, indent=2)
+                f.write(orjson.dumps(serializable_results, option=JSON_OPTIONS))
             
             print(f"Network analysis results saved to {args.output_dir}/network_analysis_results.json")
         
@@ -92,18 +95,18 @@ def main():
             optimization_results, opt_analysis = run_optimization_analysis(G, analysis_results, args.vaccines, args.output_dir)
             
             # Save optimization results
-            with open(f"{args.output_dir}/optimization_results.json", 'w') as f:
-                # Convert to serializable format
+            with open(f"{args.output_dir}/optimization_results.json", 'wb') as f:
+                # NumPy scalars are handled by orjson directly
                 serializable_results = {
                     'status': optimization_results['status'],
-                    'total_allocated': float(optimization_results['total_allocated']),
-                    'allocation': {k: float(v) for k, v in optimization_results['allocation'].items()},
+                    'total_allocated': optimization_results['total_allocated'],
+                    'allocation': optimization_results['allocation'],
                     'equity_metrics': {
-                        'before_gini': float(opt_analysis['before_gini']),
-                        'after_gini': float(opt_analysis['after_gini'])
+                        'before_gini': opt_analysis['before_gini'],
+                        'after_gini': opt_analysis['after_gini']
                     }
                 }
-                json.dump(serializable_results, f, indent=2)
+                f.write(orjson.dumps(serializable_results, option=JSON_OPTIONS))
             
             print(f"Optimization results saved to {args.output_dir}/optimization_results.json")
         
@@ -1,82 +1,223 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
 import networkx as nx
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
+# Exact betweenness is used below this many nodes; larger graphs sample source nodes
+BETWEENNESS_EXACT_MAX_NODES = 50
+BETWEENNESS_SAMPLE_SIZE = 50
+# The sampled passes are split across processes only from this many nodes; below it,
+# starting the pool and pickling the graph costs more than the passes themselves
+BETWEENNESS_PARALLEL_MIN_NODES = 5000
+
+def _transport_edges(mobility_df, threshold):
+    """(origin, destination, weight) triples for country pairs with mobility above threshold"""
+    if isinstance(mobility_df, pd.Series) and mobility_df.index.nlevels == 2:
+        # Pair-indexed Series: filter with one vectorized comparison
+        strong = mobility_df[mobility_df.to_numpy(dtype=float) > threshold]
+        return list(zip(strong.index.get_level_values(0),
+                        strong.index.get_level_values(1),
+                        strong.to_numpy(dtype=float).tolist()))
+    # Mappings keyed by (origin, destination); other keys (e.g. DataFrame columns) are skipped
+    return [(key[0], key[1], float(weight)) for key, weight in mobility_df.items()
+            if isinstance(key, tuple) and len(key) == 2 and weight > threshold]
+
 def create_vaccine_distribution_network(network_nodes, mobility_df, threshold=0.3):
     """Create a more realistic vaccine distribution network"""
     G = nx.DiGraph()  # Use directed graph for shipment flows
     
     # Add manufacturing hubs as special nodes
     manufacturers = ['US', 'IN', 'EU', 'CN']
-    for mfg in manufacturers:
-        G.add_node(mfg, type='manufacturer', capacity=100000000)
+    G.add_nodes_from(manufacturers, type='manufacturer', capacity=100000000)
     
     # Add country nodes with vaccination data
-    for _, row in network_nodes.iterrows():
-        # Calculate days since last vaccination based on doses administered
-        last_vax_days = 180  # Default to 6 months if no recent data
-        if 'new_vaccine_doses_administered' in row and row['new_vaccine_doses_administered'] > 0:
-            last_vax_days = 30  # If recent vaccinations, assume last month
-        elif 'cumulative_vaccine_doses_administered' in row and row['cumulative_vaccine_doses_administered'] > 0:
-            last_vax_days = 90  # If some vaccinations but none recent, assume 3 months
-            
-        G.add_node(row['country_code'],
-                 type='country',
-                 population=row['population'],
-                 vaccination_rate=row.get('people_vaccinated_per_hundred', 0),
-                 last_vaccination_date=(pd.Timestamp.now() - pd.Timedelta(days=last_vax_days)).strftime('%Y-%m-%d'),
-                 name=row['country_name'])
+    codes = network_nodes['country_code'].to_numpy()
+    pops = network_nodes['population'].to_numpy(dtype=float)
+    vax_rates = network_nodes['people_vaccinated_per_hundred'].to_numpy(dtype=float)
+    no_coords = np.full(len(network_nodes), np.nan)
+    lats = network_nodes['latitude'].to_numpy(dtype=float) if 'latitude' in network_nodes.columns else no_coords
+    lons = network_nodes['longitude'].to_numpy(dtype=float) if 'longitude' in network_nodes.columns else no_coords
+    
+    # Estimate days since last vaccination based on doses administered
+    last_vax_days = np.full(len(network_nodes), 180)  # Default to 6 months if no recent data
+    if 'cumulative_vaccine_doses_administered' in network_nodes.columns:
+        # If some vaccinations but none recent, assume 3 months
+        some_vax = network_nodes['cumulative_vaccine_doses_administered'].fillna(0).to_numpy() > 0
+        last_vax_days = np.where(some_vax, 90, last_vax_days)
+    if 'new_vaccine_doses_administered' in network_nodes.columns:
+        # If recent vaccinations, assume last month
+        recent_vax = network_nodes['new_vaccine_doses_administered'].fillna(0).to_numpy() > 0
+        last_vax_days = np.where(recent_vax, 30, last_vax_days)
+    # Stored as Timestamps so the optimizer doesn't have to parse formatted dates back
+    last_vax_dates = pd.Timestamp.now().normalize() - pd.to_timedelta(last_vax_days, unit='D')
+    
+    G.add_nodes_from(
+        (code, {'type': 'country',
+                'population': pop,
+                'vaccination_rate': vax_rate,
+                'last_vaccination_date': last_vax_date,
+                'name': name,
+                'lat': lat,
+                'lon': lon})
+        for code, pop, vax_rate, last_vax_date, name, lat, lon in zip(
+            codes, pops, vax_rates, last_vax_dates, network_nodes['country_name'].to_numpy(), lats, lons)
+    )
     
     # Add edges based on significant mobility (above threshold)
-    for key, weight in mobility_df.items():
-        if isinstance(key, tuple) and len(key) == 2 and weight > threshold:
-            c1, c2 = key
-            G.add_edge(c1, c2, weight=float(weight), type='transport')
+    G.add_weighted_edges_from(_transport_edges(mobility_df, threshold), type='transport')
     
     # Connect manufacturers to countries
-    for mfg in manufacturers:
-        for country in G.nodes():
-            if G.nodes[country]['type'] == 'country':
-                # Base connection weight on population and existing vaccination rate
-                weight = (G.nodes[country]['population'] / 1e6) * \
-                        (100 - G.nodes[country]['vaccination_rate']) / 100
-                G.add_edge(mfg, country, weight=weight, type='shipment')
+    # Base connection weight on population and existing vaccination rate
+    weights = (pops / 1e6) * (100 - vax_rates) / 100
+    src, tgt = np.meshgrid(np.array(manufacturers, dtype=object), codes, indexing='ij')
+    weight_mat = np.broadcast_to(weights, src.shape)
+    G.add_edges_from(
+        (mfg, country, {'weight': weight, 'type': 'shipment'})
+        for mfg, country, weight in zip(src.ravel(), tgt.ravel(), weight_mat.ravel())
+    )
     
     return G
 
+def _betweenness_from_sources(G, sources):
+    """Unnormalized Brandes accumulation over the shortest paths from `sources`"""
+    return nx.betweenness_centrality_subset(G, sources, list(G), normalized=False)
+
+def _parallel_betweenness(G, sources):
+    """Normalized betweenness from `sources` with the per-source passes split across processes
+    
+    Matches nx.betweenness_centrality(G, k=len(sources)) for the same sampled sources.
+    """
+    # Workers only need the structure, not the node data or the arrays cached in G.graph
+    H = G.__class__()
+    H.add_nodes_from(G)
+    H.add_edges_from(G.edges())
+    
+    workers = max(1, min(os.cpu_count() or 1, len(sources)))
+    chunks = [sources[i::workers] for i in range(workers)]
+    bc = dict.fromkeys(G, 0.0)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(_betweenness_from_sources, [H] * workers, chunks):
+            for node, value in partial.items():
+                bc[node] += value
+    
+    n, k = G.number_of_nodes(), len(sources)
+    if n < 3:
+        return bc  # no node lies strictly between two others
+    # Normalize by the sampled (s, t) pairs that can pass through each node. A sampled
+    # source is never between itself and a target, so it has one source fewer, the
+    # same correction nx applies. The subset variant halves undirected scores; undo that.
+    pairs = 1 if G.is_directed() else 2
+    scale_source = pairs / ((k - 1) * (n - 2)) if k > 1 else np.nan
+    scale_other = pairs / (k * (n - 2))
+    sampled = set(sources)
+    return {node: value * (scale_source if node in sampled else scale_other)
+            for node, value in bc.items()}
+
+def _betweenness_centrality(G):
+    """Exact betweenness for small graphs, source-sampled approximation otherwise"""
+    # Reuse the result cached on the graph unless nodes or edges were added since
+    key = (G.number_of_nodes(), G.number_of_edges())
+    if G.graph.get('_bc_key') == key:
+        return G.graph['_bc']
+    
+    if G.number_of_nodes() < BETWEENNESS_EXACT_MAX_NODES:
+        bc = nx.betweenness_centrality(G)
+    elif G.number_of_nodes() < BETWEENNESS_PARALLEL_MIN_NODES:
+        bc = nx.betweenness_centrality(G, k=BETWEENNESS_SAMPLE_SIZE, seed=42)
+    else:
+        # Same sources nx draws for seed=42, so both sampled paths agree
+        sources = random.Random(42).sample(list(G), BETWEENNESS_SAMPLE_SIZE)
+        bc = _parallel_betweenness(G, sources)
+    G.graph['_bc_key'] = key
+    G.graph['_bc'] = bc
+    return bc
+
+def _adjacency(G):
+    """Unweighted CSR adjacency of G and its node order, cached on the graph"""
+    # Built once per graph for the degree statistics
+    key = (G.number_of_nodes(), G.number_of_edges())
+    if G.graph.get('_adj_key') != key:
+        nodes = list(G)
+        G.graph['_adj'] = (nodes, nx.to_scipy_sparse_array(G, nodelist=nodes, weight=None, format='csr'))
+        G.graph['_adj_key'] = key
+    return G.graph['_adj']
+
 def analyze_network(G):
     """Analyze network properties"""
+    nodes, A = _adjacency(G)
+    # Same as G.degree: out- plus in-degree when directed, self-loops counted twice
+    degrees = np.asarray(A.sum(axis=1)).ravel()
+    degrees = degrees + (np.asarray(A.sum(axis=0)).ravel() if G.is_directed() else A.diagonal())
+    n = len(nodes)
+    degree_centrality = dict(zip(nodes, (degrees / (n - 1)).tolist())) if n > 1 else {v: 1 for v in nodes}
+    
     results = {
-        'degree_centrality': nx.degree_centrality(G),
-        'betweenness_centrality': nx.betweenness_centrality(G),
+        'degree_centrality': degree_centrality,
+        'betweenness_centrality': _betweenness_centrality(G),
         'bottlenecks': [],
         'manufacturers': [],
         'network': G  # Add the network itself to results
     }
     
     # Identify potential bottlenecks
-    for node in G.nodes():
-        degree = G.degree(node)
-        betweenness = results['betweenness_centrality'][node]
-        if degree > np.mean([G.degree(n) for n in G.nodes()]) and betweenness > 0.1:
-            results['bottlenecks'].append((node, degree, betweenness))
+    betweenness = np.array([results['betweenness_centrality'][n] for n in nodes])
+    for i in np.flatnonzero((degrees > degrees.mean()) & (betweenness > 0.1)):
+        results['bottlenecks'].append((nodes[i], int(degrees[i]), float(betweenness[i])))
     
     return results
 
+def _geo_layout(G):
+    """Position nodes at their (longitude, latitude) coordinates"""
+    pos = {n: (d['lon'], d['lat']) for n, d in G.nodes(data=True)
+           if not (np.isnan(d.get('lon', np.nan)) or np.isnan(d.get('lat', np.nan)))}
+    if not pos:
+        # No coordinates at all, fall back to a force-directed layout
+        return nx.spring_layout(G, k=0.5, iterations=50)
+    
+    # Nodes without coordinates (e.g. the EU hub) sit at the centroid of their neighbours
+    located = dict(pos)
+    for n in G.nodes():
+        if n not in located:
+            neighbours = [located[m] for m in nx.all_neighbors(G, n) if m in located]
+            if neighbours:
+                pos[n] = tuple(np.mean(neighbours, axis=0))
+    if len(pos) < G.number_of_nodes():
+        pos = nx.spring_layout(G, pos=pos, fixed=list(pos), iterations=5)
+    return pos
+
+def _node_cache(G):
+    """Collect node labels and the country styling data in a single pass over the nodes"""
+    mfg_labels, labels = {}, {}
+    country_nodes, vax_rates, pops = [], [], []
+    for n, d in G.nodes(data=True):
+        if d['type'] == 'manufacturer':
+            mfg_labels[n] = f"{n}\n{d['capacity']/1e6:.1f}M"
+        elif d['type'] == 'country':
+            country_nodes.append(n)
+            vax_rates.append(d['vaccination_rate'])
+            pops.append(d['population'])
+        labels[n] = d['name'] if 'name' in d else f"{n} (Mfg)"
+    return mfg_labels, labels, country_nodes, np.array(vax_rates, dtype=float), np.array(pops, dtype=float)
+
 def visualize_network(G, analysis_results, output_dir):
     """Create enhanced visualizations for directed vaccine network"""
     plt.figure(figsize=(20, 12))
-    pos = nx.spring_layout(G, k=0.5, iterations=50)
+    pos = _geo_layout(G)
+    
+    # Labels and country attributes for all nodes are collected in one pass up front
+    mfg_labels, labels, country_nodes, vax_rates, pops = _node_cache(G)
     
     # Draw nodes with different styles for manufacturers and countries
-    country_nodes = [n for n in G.nodes() if G.nodes[n]['type'] == 'country']
-    mfg_nodes = [n for n in G.nodes() if G.nodes[n]['type'] == 'manufacturer']
+    mfg_nodes = list(mfg_labels)
     
     # Draw country nodes
     nx.draw_networkx_nodes(G, pos, nodelist=country_nodes,
-                         node_color=[G.nodes[n]['vaccination_rate'] for n in country_nodes],
-                         node_size=[G.nodes[n]['population']/1e6 for n in country_nodes],
+                         node_color=vax_rates,
+                         node_size=pops/1e6,
                          cmap=plt.cm.YlOrRd, alpha=0.8)
     
     # Draw manufacturer nodes with capacity labels
@@ -86,12 +227,15 @@ def visualize_network(G, analysis_results, output_dir):
                          node_shape='s')
     
     # Add capacity labels for manufacturers
-    mfg_labels = {n: f"{n}\n{G.nodes[n]['capacity']/1e6:.1f}M" for n in mfg_nodes}
     nx.draw_networkx_labels(G, pos, mfg_labels, font_size=8, font_color='white')
     
-    # Draw edges with different styles
-    transport_edges = [(u,v) for (u,v,d) in G.edges(data=True) if d['type'] == 'transport']
-    shipment_edges = [(u,v) for (u,v,d) in G.edges(data=True) if d['type'] == 'shipment']
+    # Draw edges with different styles (split into both kinds in one pass)
+    transport_edges, shipment_edges = [], []
+    for u, v, d in G.edges(data=True):
+        if d['type'] == 'transport':
+            transport_edges.append((u, v))
+        elif d['type'] == 'shipment':
+            shipment_edges.append((u, v))
     
     nx.draw_networkx_edges(G, pos, edgelist=transport_edges,
                           edge_color='gray', width=0.5, alpha=0.3,
@@ -103,12 +247,6 @@ def visualize_network(G, analysis_results, output_dir):
                           connectionstyle='arc3,rad=0.1')
     
     # Add labels - handle both country and manufacturer nodes
-    labels = {}
-    for n in G.nodes():
-        if 'name' in G.nodes[n]:
-            labels[n] = G.nodes[n]['name']
-        else:
-            labels[n] = f"{n} (Mfg)"
     nx.draw_networkx_labels(G, pos, labels, font_size=8)
     
     plt.title("Enhanced Vaccine Distribution Network")
@@ -0,0 +1,20 @@
+import random
+
+import networkx as nx
+import pytest
+
+from network_construction import BETWEENNESS_SAMPLE_SIZE, _parallel_betweenness
+
+
+@pytest.mark.parametrize('directed', [True, False])
+def test_parallel_betweenness_matches_networkx_sampled(directed):
+    G = nx.gnp_random_graph(80, 0.08, seed=1, directed=directed)
+    sources = random.Random(42).sample(list(G), BETWEENNESS_SAMPLE_SIZE)
+    expected = nx.betweenness_centrality(G, k=BETWEENNESS_SAMPLE_SIZE, seed=42)
+    assert _parallel_betweenness(G, sources) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('directed', [True, False])
+def test_parallel_betweenness_matches_networkx_exact(directed):
+    G = nx.gnp_random_graph(40, 0.1, seed=2, directed=directed)
+    assert _parallel_betweenness(G, list(G)) == pytest.approx(nx.betweenness_centrality(G))